@@ -1,31 +1,115 @@
 # app/api/v2/endpoints/profiles.py
 
+import asyncio
+import hmac
 import logging
+import threading
+import time
 import yaml
-from fastapi import APIRouter, Query, HTTPException, Response, Depends
-from typing import List, Optional
+from collections import OrderedDict
+from fastapi import APIRouter, Body, Query, HTTPException, Response, Depends
+from fastapi.responses import StreamingResponse
+from typing import List, Optional, Dict, Any, Iterator, Tuple
 
 from app.core.config import settings
 from app.services.profile_service import ProfileService
+from app.services.clash_config_service import ClashConfigService
 
 router = APIRouter()
 
 logger = logging.getLogger(__name__)
 
+# Prefer the libyaml-backed dumper for serializing generated configs
+Dumper = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+
+# Number of list items serialized per streamed chunk
+YAML_CHUNK_SIZE = 500
+
+def iter_yaml(config: Dict[str, Any], chunk_size: int = YAML_CHUNK_SIZE) -> Iterator[str]:
+    """
+    Serialize a config mapping to YAML piece by piece.
+    Top-level keys are dumped one at a time and long lists in slices; since block
+    sequences under a mapping key are not indented, the concatenated chunks equal a
+    single dump of the whole mapping.
+    """
+    for key, value in config.items():
+        if isinstance(value, list) and len(value) > chunk_size:
+            yield yaml.dump({key: value[:chunk_size]}, Dumper=Dumper, sort_keys=False, allow_unicode=True)
+            for start in range(chunk_size, len(value), chunk_size):
+                yield yaml.dump(value[start:start + chunk_size], Dumper=Dumper, sort_keys=False, allow_unicode=True)
+        else:
+            yield yaml.dump({key: value}, Dumper=Dumper, sort_keys=False, allow_unicode=True)
+
+# (names, override) -> (generation stamp, expiry time, headers, body), in LRU order
+_response_cache: "OrderedDict[Tuple[Tuple[str, ...], Optional[str]], Tuple[Any, float, Dict[str, str], bytes]]" = OrderedDict()
+_response_cache_lock = threading.Lock()
+
+def _get_cached_response(key: Tuple[Tuple[str, ...], Optional[str]], stamp: Any) -> Optional[Tuple[Dict[str, str], bytes]]:
+    with _response_cache_lock:
+        entry = _response_cache.get(key)
+        if entry is None:
+            return None
+        cached_stamp, expires_at, headers, body = entry
+        if cached_stamp != stamp or expires_at < time.monotonic():
+            del _response_cache[key]
+            return None
+        _response_cache.move_to_end(key)
+        return headers, body
+
+def _cache_while_streaming(key: Tuple[Tuple[str, ...], Optional[str]], stamp: Any,
+                           headers: Dict[str, str], chunks: Iterator[str]) -> Iterator[str]:
+    # Pass chunks through to the client and store the full body once streaming completes
+    parts = []
+    for chunk in chunks:
+        parts.append(chunk)
+        yield chunk
+
+    body = "".join(parts).encode("utf-8")
+    with _response_cache_lock:
+        _response_cache[key] = (stamp, time.monotonic() + settings.RESPONSE_CACHE_TTL, headers, body)
+        _response_cache.move_to_end(key)
+        while len(_response_cache) > settings.RESPONSE_CACHE_SIZE:
+            _response_cache.popitem(last=False)
+
+def clear_response_cache() -> int:
+    with _response_cache_lock:
+        count = len(_response_cache)
+        _response_cache.clear()
+    return count
+
+# Encoded once so each request only pays for the constant-time comparison
+_API_KEY = settings.API_KEY.encode()
+
 async def verify_api_key(api_key: Optional[str] = Query(None)):
     if settings.USE_API_KEY:
-        if not api_key or api_key != settings.API_KEY:
+        if not api_key or not hmac.compare_digest(api_key.encode(), _API_KEY):
             raise HTTPException(status_code=403, detail="Invalid API Key")
 
+# The services hold no per-request state, so share one instance across requests
+_profile_service = ProfileService(ClashConfigService())
+
+def get_profile_service() -> ProfileService:
+    return _profile_service
+
 @router.get("/")
 async def get_profiles(name: List[str] = Query(...),
                        override: Optional[str] = Query(None),
                        _: None = Depends(verify_api_key),
-                       profile_service: ProfileService = Depends(ProfileService)):
+                       profile_service: ProfileService = Depends(get_profile_service)):
+
+    # Profile order matters (proxy order, file name), so it is part of the key as given
+    cache_key = (tuple(name), override)
+    stamp = None
+    if settings.RESPONSE_CACHE_TTL > 0:
+        stamp = profile_service.get_generation_stamp(name)
+        cached = _get_cached_response(cache_key, stamp) if stamp is not None else None
+        if cached is not None:
+            cached_headers, body = cached
+            return Response(content=body, media_type="text/plain; charset=utf-8", headers=cached_headers)
 
     full_config, sub_info = await profile_service.generate_multiple_profiles_with_config(name, override)
     
-    logger.debug(f"Get sub_info for profiles {name}: {sub_info}")
+    logger.debug("Get sub_info for profiles %s: %s", name, sub_info)
 
     headers = {"Content-Disposition": f"inline; filename={name[0]}.yaml"}
     if "upload" in sub_info and "expire" in sub_info:
@@ -33,8 +117,13 @@ async def get_profiles(name: List[str] = Query(...),
             f"upload={sub_info['upload']}; download={sub_info['download']}; total={sub_info['total']}; expire={sub_info.get('expire', '0')}"
         )
 
-    return Response(
-        content=yaml.safe_dump(full_config, sort_keys=False, allow_unicode=True),
+    content = iter_yaml(full_config)
+    if stamp is not None:
+        content = _cache_while_streaming(cache_key, stamp, headers, content)
+
+    # Starlette runs sync iterators in its threadpool, so dumping also stays off the event loop
+    return StreamingResponse(
+        content=content,
         media_type="text/plain; charset=utf-8",
         headers=headers
     )
@@ -43,10 +132,51 @@ async def get_profiles(name: List[str] = Query(...),
 @router.get("/{profile}/update")
 async def update_profile(profile: str, 
                          url: str = Query(...), 
-                         profile_service: ProfileService = Depends(ProfileService),
+                         profile_service: ProfileService = Depends(get_profile_service),
                          _: None = Depends(verify_api_key)):
     count = await profile_service.fetch_and_update_profile(profile, url)
     return {
         "status": "success",
         "message": f"Profile '{profile}' updated with {count} proxies."
+    }
+
+@router.post("/refresh")
+async def refresh_profiles(sources: Dict[str, str] = Body(..., description="Mapping of profile name to subscription URL"),
+                           profile_service: ProfileService = Depends(get_profile_service),
+                           _: None = Depends(verify_api_key)):
+    # Reject the whole batch up front rather than after some profiles were written
+    for profile in sources:
+        profile_service.check_profile_name(profile)
+
+    # Fetch all subscriptions concurrently; the shared HTTP client pools (and with HTTP/2 multiplexes) connections
+    results = await asyncio.gather(*(profile_service.fetch_and_update_profile(profile, url) for profile, url in sources.items()),
+                                   return_exceptions=True)
+
+    updated = {}
+    failed = {}
+    for profile, result in zip(sources, results):
+        if isinstance(result, HTTPException):
+            failed[profile] = result.detail
+        elif isinstance(result, Exception):
+            # Other profiles may already be saved, so report this one instead of failing the batch
+            logger.exception("Unexpected error refreshing profile '%s'", profile, exc_info=result)
+            failed[profile] = "Internal error while updating profile."
+        elif isinstance(result, BaseException):
+            raise result
+        else:
+            updated[profile] = result
+
+    return {
+        "status": "success" if not failed else "partial",
+        "message": f"Updated {len(updated)} of {len(sources)} profiles.",
+        "updated": updated,
+        "failed": failed
+    }
+
+@router.delete("/cache")
+async def clear_cache(_: None = Depends(verify_api_key)):
+    count = clear_response_cache()
+    return {
+        "status": "success",
+        "message": f"Cleared {count} cached responses."
     }
\ No newline at end of file
@@ -7,6 +7,11 @@ class Settings(BaseSettings):
     API_KEY: str
     PROFILE_DIR: str = "./data/profiles"
     RULES_DIR: str = "./data/rules"
+    # Pretty Rich console logging and per-request access logs; plain stream logging otherwise
+    DEV_LOGGING: bool = False
+    # Generated /profiles responses are reused for this many seconds (0 disables caching)
+    RESPONSE_CACHE_TTL: float = 300
+    RESPONSE_CACHE_SIZE: int = 32
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
 
 settings = Settings()
\ No newline at end of file
@@ -0,0 +1,23 @@
+# app/core/yaml_loader.py
+
+import yaml
+
+# Prefer the libyaml-backed loader, fall back to the pure-Python one
+_SafeLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+_TIMESTAMP_TAG = "tag:yaml.org,2002:timestamp"
+
+
+class Loader(_SafeLoader):
+    """
+    Safe loader for Clash YAML without the implicit timestamp resolver.
+    Clash has no date values, but the resolver's regex still runs against every
+    digit-leading scalar that is not a number (e.g. each server IP).
+    Unquoted dates load as plain strings.
+    """
+
+
+Loader.yaml_implicit_resolvers = {
+    first: [(tag, regexp) for tag, regexp in resolvers if tag != _TIMESTAMP_TAG]
+    for first, resolvers in _SafeLoader.yaml_implicit_resolvers.items()
+}
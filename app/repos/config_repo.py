@@ -1,29 +1,69 @@
 import os
 import yaml
 import logging
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Tuple
 from app.core.config import settings
+from app.core.yaml_loader import Loader
+from app.repos.file_cache import FileCache
 
 logger = logging.getLogger(__name__)
 
 class ConfigRepo:
+    # Maximum number of parsed files kept in memory
+    CACHE_SIZE = 64
+
     def __init__(self):
         self.rules_dir = settings.RULES_DIR
         os.makedirs(self.rules_dir, exist_ok=True)
+        self._cache = FileCache(self.CACHE_SIZE)
+
+    def _parse_yaml(self, path: str) -> Dict[str, Any]:
+        # Read the whole file in one call and hand libyaml the bytes, instead of
+        # letting the parser pull the stream through repeated Python-level read() calls
+        with open(path, 'rb') as file:
+            data = file.read()
+        return yaml.load(data, Loader=Loader) or {}
+
+    def _parse_lines(self, path: str) -> List[str]:
+        lines = []
+        append = lines.append
+        # Provider lists can be tens of thousands of lines; use a larger read buffer
+        with open(path, 'r', encoding='utf-8', buffering=65536) as file:
+            for line in file:
+                # Filter comments and empty lines, stripping each line only once
+                stripped = line.strip()
+                if stripped and stripped[0] != '#':
+                    append(stripped)
+        return lines
 
     def _load_yaml(self, filename: str) -> Dict[str, Any]:
         path = os.path.join(self.rules_dir, filename)
-        if not os.path.exists(path):
-            logger.warning(f"Configuration file not found: {path}")
-            return {}
-        
         try:
-            with open(path, 'r', encoding='utf-8') as file:
-                return yaml.safe_load(file) or {}
+            return self._cache.get(path, self._parse_yaml)
+        except FileNotFoundError:
+            logger.warning("Configuration file not found: %s", path)
+            return {}
         except Exception as e:
-            logger.error(f"Error loading configuration file {path}: {e}")
+            logger.error("Error loading configuration file %s: %s", path, e)
             return {}
 
+    def get_stamp(self) -> Tuple[Tuple[str, int, int], ...]:
+        """
+        Return (path, mtime_ns, size) for every file under the rules directory.
+        Editing, adding or removing any rule, override or provider file changes the stamp.
+        """
+        stamp = []
+        for root, _, files in os.walk(self.rules_dir):
+            for filename in files:
+                path = os.path.join(root, filename)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                stamp.append((path, st.st_mtime_ns, st.st_size))
+        stamp.sort()
+        return tuple(stamp)
+
     def load_rules(self) -> Dict[str, Any]:
         return self._load_yaml("rules.yaml")
 
@@ -50,17 +90,13 @@ class ConfigRepo:
             clean_path = clean_path[2:]
         
         path = os.path.join(self.rules_dir, clean_path)
-        
-        if not os.path.exists(path):
-            logger.warning(f"Rule provider file not found: {path}")
-            return []
-        
         try:
-            with open(path, 'r', encoding='utf-8') as file:
-                # Filter comments and empty lines
-                return [line.strip() for line in file if line.strip() and not line.strip().startswith('#')]
+            return self._cache.get(path, self._parse_lines)
+        except FileNotFoundError:
+            logger.warning("Rule provider file not found: %s", path)
+            return []
         except Exception as e:
-            logger.error(f"Error loading rule provider file {path}: {e}")
+            logger.error("Error loading rule provider file %s: %s", path, e)
             return []
 
 config_repo = ConfigRepo()
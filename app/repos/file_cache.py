@@ -0,0 +1,45 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Tuple
+
+class FileCache:
+    '''
+    Bounded LRU of parsed file contents, keyed by path.
+    Entries are validated against the file's (mtime_ns, size) on every lookup,
+    so edits on disk are picked up without explicit invalidation.
+    Cached objects are shared between callers and must be treated as read-only.
+    '''
+    def __init__(self, max_size: int = 64):
+        self.max_size = max_size
+        # path -> ((mtime_ns, size), parsed content), in LRU order
+        self._entries: "OrderedDict[str, Tuple[Tuple[int, int], Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path: str, parse: Callable[[str], Any]) -> Any:
+        '''
+        Return parse(path), reusing the previous result while the file is unchanged.
+        Raises:
+            FileNotFoundError: If the file does not exist.
+        '''
+        st = os.stat(path)
+        stamp = (st.st_mtime_ns, st.st_size)
+
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == stamp:
+                self._entries.move_to_end(path)
+                return entry[1]
+
+        data = parse(path)
+
+        with self._lock:
+            self._entries[path] = (stamp, data)
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return data
+
+    def invalidate(self, path: str) -> None:
+        with self._lock:
+            self._entries.pop(path, None)
@@ -1,19 +1,61 @@
 import os
 import yaml
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
 from app.core.config import settings
+from app.core.yaml_loader import Loader
+from app.repos.file_cache import FileCache
+
+# Prefer the libyaml-backed dumper, fall back to the pure-Python one
+Dumper = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
 
 class ProfileRepo:
+    # Maximum number of parsed profiles kept in memory
+    CACHE_SIZE = 64
+
     def __init__(self):
         self.base_path = settings.PROFILE_DIR
         os.makedirs(self.base_path, exist_ok=True)
+        self._cache = FileCache(self.CACHE_SIZE)
+
+    def validate_name(self, name: str) -> None:
+        '''
+        Ensure a profile name refers to a file directly inside the profile directory.
+        Args:
+            name (str): The name of the profile.
+        Raises:
+            ValueError: If the name is empty, absolute, or contains a path separator or '..'.
+        '''
+        if not name or "/" in name or "\\" in name or ".." in name or os.path.isabs(name):
+            raise ValueError(f"Invalid profile name '{name}'.")
 
     def _get_path(self, name: str) -> str:
+        self.validate_name(name)
         return os.path.join(self.base_path, f"{name}.yaml")
     
+    def get_stamp(self, name: str) -> Optional[Tuple[int, int]]:
+        '''
+        Get the modification stamp of a profile.
+        Args:
+            name (str): The name of the profile.
+        Returns:
+            Optional[Tuple[int, int]]: (mtime_ns, size) of the profile file, or None if it does not exist
+            (which includes invalid names).
+        '''
+        try:
+            st = os.stat(self._get_path(name))
+        except (FileNotFoundError, ValueError):
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _parse_profile(self, path: str) -> Optional[Dict[str, Any]]:
+        # Binary mode lets libyaml decode the input itself
+        with open(path, 'rb') as file:
+            return yaml.load(file, Loader=Loader)
+
     def load_profile(self, name: str) -> Optional[Dict[str, Any]]:
         '''
         Load a profile by name.
+        Parsed profiles are cached until the file changes; the returned data is shared and must not be modified.
         Args:
             name (str): The name of the profile to load.
         Returns:
@@ -21,15 +63,13 @@ class ProfileRepo:
         Raises:
             FileNotFoundError: If the profile does not exist.
             IOError: If there is an error reading the profile file.
+            ValueError: If the profile name is invalid.
         '''
         path = self._get_path(name)
-        if not os.path.exists(path):
-            raise FileNotFoundError(f"Profile '{name}' does not exist.")
-        
         try:
-            with open(path, 'r') as file:
-                profile = yaml.safe_load(file)
-                return profile
+            return self._cache.get(path, self._parse_profile)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Profile '{name}' does not exist.")
         except Exception as e:
             raise IOError(f"Error loading profile '{name}': {e}")
         
@@ -41,12 +81,15 @@ class ProfileRepo:
             profile (Dict[str, Any]): The profile data to save.
         Raises:
             IOError: If there is an error writing the profile file.
+            ValueError: If the profile name is invalid.
         '''
         path = self._get_path(name)
         try:
             with open(path, 'w', encoding='utf-8') as file:
-                yaml.safe_dump(profile, file, default_flow_style=False, sort_keys=False, allow_unicode=True)
+                yaml.dump(profile, file, Dumper=Dumper, default_flow_style=False, sort_keys=False, allow_unicode=True)
         except Exception as e:
             raise IOError(f"Error saving profile '{name}': {e}")
+        finally:
+            self._cache.invalidate(path)
         
 profile_repo = ProfileRepo()
\ No newline at end of file
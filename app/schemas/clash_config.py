@@ -1,30 +1,21 @@
-from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from pydantic import Field
+from pydantic.dataclasses import dataclass
+from typing import List, Optional
 
-class ProxyGroup(BaseModel):
+# ProxyGroup and RuleProvider are validated from the rule files on every request;
+# slotted pydantic dataclasses keep the same validation without a per-instance __dict__
+@dataclass(slots=True)
+class ProxyGroup:
     name: str
     type: str
-    proxies: List[str] = []
+    proxies: List[str] = Field(default_factory=list)
     url: Optional[str] = None
     interval: Optional[int] = None
     tolerance: Optional[int] = None
     filter: Optional[str] = None
     removable: bool = Field(False, exclude=True)
 
-class RuleProvider(BaseModel):
+@dataclass(slots=True)
+class RuleProvider:
     type: str
     path: str
-
-class ClashConfig(BaseModel):
-    mixed_port: int = Field(7890, alias="mixed-port")
-    allow_lan: bool = Field(False, alias="allow-lan")
-    mode: str = Field("Rule", alias="mode")
-    log_level: str = Field("info", alias="log-level")
-    external_controller: str = Field(":9090", alias="external-controller")
-    proxies: List[Dict[str, Any]] = []
-    proxy_groups: List[ProxyGroup] = Field(..., alias="proxy-groups")
-    rules: List[str] = []
-
-    model_config = {
-        "populate_by_name": True
-    }
\ No newline at end of file
@@ -1,14 +1,29 @@
-from typing import List, Dict, Any, Set, Optional
+from typing import List, Dict, Any, Set, FrozenSet, Optional
+import asyncio
 import logging
 import re
-from pydantic import ValidationError
+from collections import defaultdict, deque
+from functools import lru_cache
+from pydantic import TypeAdapter, ValidationError
 from app.repos.config_repo import config_repo
-from app.schemas.clash_config import ClashConfig, ProxyGroup, RuleProvider
+from app.schemas.clash_config import ProxyGroup, RuleProvider
 
 logger = logging.getLogger(__name__)
 
+@lru_cache(maxsize=256)
+def _compile_filter(filter_regex: str) -> re.Pattern:
+    # Group filters come from rarely-changing config files, so compile each one once per process
+    return re.compile(filter_regex, re.IGNORECASE)
+
+# Targets that are always valid in proxy groups and rules
+_BUILT_IN_TARGETS = frozenset({"DIRECT", "REJECT", "NO-HYDRA"})
+
+# Built once so the core schema is not regenerated per request
+_PG_ADAPTER = TypeAdapter(List[ProxyGroup])
+_PG_ITEM_ADAPTER = TypeAdapter(ProxyGroup)
+
 class ClashConfigService:
-    def add_config_to_proxies(self, proxies: List[Dict[str, Any]], override_data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    async def add_config_to_proxies(self, proxies: List[Dict[str, Any]], override_data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
         Loads configuration from repo and generates the full Clash config.
         Parameters:
@@ -17,8 +32,11 @@ class ClashConfigService:
         Returns:
             Dict[str, Any]: The complete Clash configuration dictionary.
         """
-        pg_data = config_repo.load_proxy_groups()
-        rules = config_repo.load_rules()
+        # The two files are independent, so read them concurrently off the event loop
+        pg_data, rules = await asyncio.gather(
+            asyncio.to_thread(config_repo.load_proxy_groups),
+            asyncio.to_thread(config_repo.load_rules),
+        )
         
         return self.generate_config(proxies, pg_data, rules, override_data)
     
@@ -48,25 +66,23 @@ class ClashConfigService:
         
         # 2. Process Rules
         group_names = set(g.get("name") for g in processed_groups if "name" in g)
-        built_ins = {"DIRECT", "REJECT", "NO-HYDRA"}
-        valid_targets = proxy_names_set.union(group_names).union(built_ins)
+        valid_targets = frozenset(proxy_names_set.union(group_names, _BUILT_IN_TARGETS))
         processed_rules = self._process_rules(rules_data, valid_targets)
 
-        config = ClashConfig(
-            mixed_port=7890,
-            allow_lan=False,
-            mode="Rule",
-            log_level="info",
-            external_controller=":9090",
-            proxies=proxies,
-            proxy_groups=processed_groups,
-            rules=processed_rules
-        )
-
-        final_config = config.model_dump(by_alias=True, exclude_none=True)
+        # Inputs are already validated plain data, so build the aliased output directly
+        final_config = {
+            "mixed-port": 7890,
+            "allow-lan": False,
+            "mode": "Rule",
+            "log-level": "info",
+            "external-controller": ":9090",
+            "proxies": proxies,
+            "proxy-groups": [self._dump_group(g) for g in processed_groups],
+            "rules": processed_rules,
+        }
 
         if override_data:
-            logger.info(f"Applying override configuration (keys: {list(override_data.keys())})")
+            logger.info("Applying override configuration (keys: %s)", list(override_data.keys()))
             final_config.update(override_data)
 
         return final_config
@@ -77,109 +93,148 @@ class ClashConfigService:
                         proxy_names_set: Set[str]) -> List[Dict[str, Any]]:
         active_groups = {}
         used_proxies = set()
+        proxy_group_seen = set()
+        # Bind hot-loop methods to locals
+        mark_used = used_proxies.add
         
-        for raw_group in raw_groups:
-            try:
-                # Validate against ProxyGroup schema
-                group_model = ProxyGroup(**raw_group)
-                group = group_model.model_dump(by_alias=True)
-                # Restore removable field for internal logic as it is excluded in dump
-                group['removable'] = group_model.removable
-            except ValidationError as e:
-                logger.warning(f"Invalid proxy group configuration: {e}")
-                continue
+        for group_model in self._validate_groups(raw_groups):
+            group = _PG_ITEM_ADAPTER.dump_python(group_model, by_alias=True)
+            # Restore removable field for internal logic as it is excluded in dump
+            group['removable'] = group_model.removable
 
             group_name = group.get("name")
+
+            # Deduplicate while building, keeping first occurrence order
+            seen = set()
+            proxies = []
+            mark_seen = seen.add
+            append = proxies.append
+
+            # Track explicit proxies
+            for p in group["proxies"]:
+                if p not in seen:
+                    mark_seen(p)
+                    append(p)
+                    if p in proxy_names_set:
+                        mark_used(p)
             
             # 1. Expand Regex
             filter_regex = group.pop("filter", None)
             if filter_regex:
                 try:
-                    pattern = re.compile(filter_regex, re.IGNORECASE)
+                    search = _compile_filter(filter_regex).search
                     # Use ordered list to maintain order in regex matches too
-                    matched = [name for name in ordered_proxy_names if pattern.search(name)]
-                    group["proxies"].extend(matched)
-                    used_proxies.update(matched)
+                    for name in ordered_proxy_names:
+                        if name not in seen and search(name):
+                            mark_seen(name)
+                            append(name)
+                            mark_used(name)
                 except re.error as e:
-                    logger.warning(f"Invalid regex '{filter_regex}' in group '{group_name}': {e}")
-
-            # Track explicit proxies
-            for p in group["proxies"]:
-                if p in proxy_names_set:
-                    used_proxies.add(p)
+                    logger.warning("Invalid regex '%s' in group '%s': %s", filter_regex, group_name, e)
 
-            # Deduplicate proxies
-            group["proxies"] = list(dict.fromkeys(group["proxies"]))
-            
+            group["proxies"] = proxies
             active_groups[group_name] = group
+            if group_name == "PROXY":
+                proxy_group_seen = seen
 
         # 2. Handle Unclassified Proxies (Maintain Order)
         unclassified = [p for p in ordered_proxy_names if p not in used_proxies]
         
         if unclassified:
             if "PROXY" in active_groups:
-                logger.info(f"Adding {len(unclassified)} unclassified proxies to PROXY group.")
-                active_groups["PROXY"]["proxies"].extend(unclassified)
-                active_groups["PROXY"]["proxies"] = list(dict.fromkeys(active_groups["PROXY"]["proxies"]))
+                logger.info("Adding %s unclassified proxies to PROXY group.", len(unclassified))
+                proxy_group = active_groups["PROXY"]["proxies"]
+                for p in unclassified:
+                    if p not in proxy_group_seen:
+                        proxy_group_seen.add(p)
+                        proxy_group.append(p)
             else:
-                logger.warning(f"Found {len(unclassified)} unclassified proxies but 'PROXY' group does not exist.")
+                logger.warning("Found %s unclassified proxies but 'PROXY' group does not exist.", len(unclassified))
 
-        built_ins = {"DIRECT", "REJECT", "NO-HYDRA"}
-        base_valid_targets = proxy_names_set.union(built_ins)
+        base_valid_targets = frozenset(proxy_names_set.union(_BUILT_IN_TARGETS))
         
         # 3. Iterative Pruning
         self._prune_groups(active_groups, base_valid_targets)
             
         return list(active_groups.values())
 
-    def _prune_groups(self, active_groups: Dict[str, Dict[str, Any]], base_valid_targets: Set[str]) -> None:
-        while True:
-            removed_count = 0
-            valid_targets = base_valid_targets.union(active_groups.keys())
-            
-            groups_to_remove = []
-            
-            for name, group in active_groups.items():
-                removable = group.get("removable", False)
-                
-                current_proxies = group["proxies"]
-                valid_proxies = []
-                should_remove_group = False
-                
-                for p in current_proxies:
-                    if p in valid_targets:
-                        valid_proxies.append(p)
-                    else:
-                        if removable:
-                            logger.warning(f"Group '{name}' (removable=True) references missing target '{p}'. Removing group.")
-                            should_remove_group = True
-                            break
-                
-                if should_remove_group:
-                    groups_to_remove.append(name)
-                    continue
-                
+    def _dump_group(self, group: Dict[str, Any]) -> Dict[str, Any]:
+        # Mirrors dumping ProxyGroup with exclude_none=True: drop unset fields and the internal 'removable' flag
+        return {k: v for k, v in group.items() if v is not None and k != "removable"}
+
+    def _validate_groups(self, raw_groups: List[Dict[str, Any]]) -> List[ProxyGroup]:
+        # Validate the whole list in one pass; only fall back to per-item
+        # validation when something is invalid, so that bad groups are skipped individually
+        try:
+            return _PG_ADAPTER.validate_python(raw_groups)
+        except ValidationError:
+            pass
+
+        models = []
+        for raw_group in raw_groups:
+            try:
+                models.append(_PG_ITEM_ADAPTER.validate_python(raw_group))
+            except ValidationError as e:
+                logger.warning("Invalid proxy group configuration: %s", e)
+        return models
+
+    def _prune_groups(self, active_groups: Dict[str, Dict[str, Any]], base_valid_targets: FrozenSet[str]) -> None:
+        # Reverse index: group name -> names of groups that reference it
+        referenced_by: Dict[str, Set[str]] = defaultdict(set)
+        for name, group in active_groups.items():
+            for p in group["proxies"]:
+                if p in active_groups:
+                    referenced_by[p].add(name)
+
+        # Every group is checked once; a group is re-checked only when one of its targets is removed
+        pending = deque(active_groups)
+        queued = set(active_groups)
+        # Kept in sync with active_groups instead of being rebuilt per check
+        valid_targets = set(base_valid_targets)
+        valid_targets.update(active_groups)
+
+        while pending:
+            name = pending.popleft()
+            queued.discard(name)
+            group = active_groups.get(name)
+            if group is None:
+                continue
+
+            removable = group.get("removable", False)
+            valid_proxies = []
+            should_remove_group = False
+
+            for p in group["proxies"]:
+                if p in valid_targets:
+                    valid_proxies.append(p)
+                elif removable:
+                    logger.warning("Group '%s' (removable=True) references missing target '%s'. Removing group.", name, p)
+                    should_remove_group = True
+                    break
+
+            if not should_remove_group:
                 group["proxies"] = valid_proxies
-                
-                if not group["proxies"]:
-                    logger.warning(f"Group '{name}' is empty. Removing group.")
-                    groups_to_remove.append(name)
-            
-            for name in groups_to_remove:
-                if name in active_groups:
-                    del active_groups[name]
-                    removed_count += 1
-            
-            if removed_count == 0:
-                break
+                if not valid_proxies:
+                    logger.warning("Group '%s' is empty. Removing group.", name)
+                    should_remove_group = True
+
+            if should_remove_group:
+                del active_groups[name]
+                if name not in base_valid_targets:
+                    valid_targets.discard(name)
+                for parent in referenced_by.pop(name, ()):
+                    if parent in active_groups and parent not in queued:
+                        pending.append(parent)
+                        queued.add(parent)
 
-    def _process_rules(self, rules_data: Dict[str, Any], valid_targets: Set[str]) -> List[str]:
+    def _process_rules(self, rules_data: Dict[str, Any], valid_targets: FrozenSet[str]) -> List[str]:
         if not rules_data:
             return []
 
         rule_providers_data = rules_data.get("rule-providers", {})
         raw_rules = rules_data.get("rules", [])
         valid_rules = []
+        add_rule = valid_rules.append
         
         # Validate Rule Providers
         validated_providers = {}
@@ -188,31 +243,33 @@ class ClashConfigService:
                 provider = RuleProvider(**data)
                 validated_providers[name] = provider
             except ValidationError as e:
-                logger.warning(f"Invalid RuleProvider '{name}': {e}")
+                logger.warning("Invalid RuleProvider '%s': %s", name, e)
                 continue
 
         for rule in raw_rules:
             if not isinstance(rule, str) or not rule.strip():
                 continue
                 
-            parts = [p.strip() for p in rule.split(',')]
-            rule_type = parts[0]
+            # Slice out only the fields we need instead of splitting the whole rule
+            rule_type, _, rest = rule.partition(',')
+            rule_type = rule_type.strip()
             
             if rule_type == "RULE-SET":
-                if len(parts) < 3:
-                    logger.warning(f"Invalid RULE-SET format: {rule}")
+                provider_name, sep, rest = rest.partition(',')
+                if not sep:
+                    logger.warning("Invalid RULE-SET format: %s", rule)
                     continue
                     
-                provider_name = parts[1]
-                target = parts[2]
+                provider_name = provider_name.strip()
+                target = rest.partition(',')[0].strip()
                 
                 if target not in valid_targets:
-                    logger.warning(f"RULE-SET target '{target}' invalid. Skipping.")
+                    logger.warning("RULE-SET target '%s' invalid. Skipping.", target)
                     continue
 
                 provider = validated_providers.get(provider_name)
                 if not provider:
-                    logger.warning(f"Provider '{provider_name}' not found or invalid.")
+                    logger.warning("Provider '%s' not found or invalid.", provider_name)
                     continue
                 
                 expanded_rules = self._expand_rule_set(provider, target)
@@ -220,19 +277,20 @@ class ClashConfigService:
                     
             else:
                 target = None
-                if parts[0] == "MATCH":
-                    if len(parts) >= 2:
-                        target = parts[1]
-                elif len(parts) >= 3:
-                        target = parts[2]
+                if rule_type == "MATCH":
+                    target = rest.partition(',')[0].strip()
+                else:
+                    _, sep, rest = rest.partition(',')
+                    if sep:
+                        target = rest.partition(',')[0].strip()
                 
                 if target:
                     if target in valid_targets:
-                        valid_rules.append(rule)
+                        add_rule(rule)
                     else:
-                        logger.warning(f"Rule target '{target}' invalid or missing. Skipping rule: {rule}")
+                        logger.warning("Rule target '%s' invalid or missing. Skipping rule: %s", target, rule)
                 else:
-                    valid_rules.append(rule)
+                    add_rule(rule)
                     
         return valid_rules
 
@@ -242,15 +300,24 @@ class ClashConfigService:
             return []
             
         lines = config_repo.load_provider_file(file_path)
+        # Every expanded rule ends in one of these two suffixes, so build them once
+        target_suffix = f",{target}"
+        no_resolve_suffix = f",{target},no-resolve"
+
         expanded_rules = []
+        append = expanded_rules.append
         for line in lines:
-            line_parts = [p.strip() for p in line.split(',')]
+            # Only the last field matters for no-resolve detection
+            head, _, last = line.rpartition(',')
+            if last.strip().lower() == "no-resolve":
+                line = head
+                suffix = no_resolve_suffix
+            else:
+                suffix = target_suffix
             
-            suffix = ""
-            if line_parts[-1].lower() == "no-resolve":
-                line_parts.pop()
-                suffix = ",no-resolve"
+            # Lines are stripped on load; only normalise inner whitespace when present
+            if ' ' in line or '\t' in line:
+                line = ','.join(p.strip() for p in line.split(','))
             
-            expanded_rule = f"{','.join(line_parts)},{target}{suffix}"
-            expanded_rules.append(expanded_rule)
+            append(line + suffix)
         return expanded_rules
\ No newline at end of file
@@ -1,120 +1,209 @@
 # app/services/profile_service.py
 
+import asyncio
+import calendar
 import httpx
+import importlib.util
 import logging
 import re
+import time
+import yaml
+from itertools import chain
 from typing import List, Dict, Any, Tuple, Optional
-from datetime import datetime
 from fastapi import HTTPException, Depends
-from yaml import safe_load
 
+from app.core.yaml_loader import Loader
 from app.repos.profile_repo import profile_repo
 from app.repos.config_repo import config_repo
 from app.services.clash_config_service import ClashConfigService
 
 logger = logging.getLogger(__name__)
 
+# Subscription metadata embedded in proxy names, e.g. "Traffic: 74.95 GB / 200 GB | Expire: 2026-01-04"
+# (also matches the Chinese "流量"/"到期"/"过期" labels)
+_TRAFFIC_RE = re.compile(r"(?:Traffic|流量).*?(\d+(?:\.\d+)?)\s*(TB|T|GB|G|MB|M).*?(\d+(?:\.\d+)?)\s*(TB|T|GB|G|MB|M)", re.IGNORECASE)
+_EXPIRE_RE = re.compile(r"(?:Expire|到期|过期).*?(\d{4}-\d{2}-\d{2})", re.IGNORECASE)
+
+# Bytes per (upper-cased) unit captured by _TRAFFIC_RE
+_UNIT_MULT = {"T": 1 << 40, "TB": 1 << 40, "G": 1 << 30, "GB": 1 << 30, "M": 1 << 20, "MB": 1 << 20}
+
+# One "key=integer" field of a subscription-userinfo header; fields with non-integer values are skipped
+_USERINFO_FIELD_RE = re.compile(r"(\w+)\s*=\s*(\d+)\s*(?=;|$)")
+
+# Proxy names containing any of these are subscription info nodes rather than real servers
+_TRAFFIC_NODE_TOKENS = ("Traffic", "流量", "Expire", "到期")
+
+# HTTP/2 lets concurrent fetches to the same host share one connection; httpx needs the optional h2 package for it
+_HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+# Shared by all subscription fetches so connections are pooled and reused.
+# Opened and closed with the application lifespan (see main.py); created on demand otherwise.
+_http_client: Optional[httpx.AsyncClient] = None
+
+def open_http_client() -> httpx.AsyncClient:
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            http2=_HTTP2_AVAILABLE,
+            verify=False,
+            timeout=httpx.Timeout(30.0, connect=10.0),
+            follow_redirects=True,
+            # Use a compatible User-Agent to avoid blocks
+            headers={
+                "User-Agent": "Clash.Meta/1.18.1 Proxygen/0.1.0",
+                "Accept": "application/x-yaml, text/yaml, text/plain",
+            },
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=30, keepalive_expiry=30.0),
+        )
+    return _http_client
+
+async def close_http_client() -> None:
+    global _http_client
+    client, _http_client = _http_client, None
+    if client is not None:
+        await client.aclose()
+
 class ProfileService:
     def __init__(self, clash_config_service: ClashConfigService = Depends(ClashConfigService)):
         self.clash_config_service = clash_config_service
 
     async def generate_multiple_profiles_with_config(self, name: List[str], override: Optional[str] = None) -> Tuple[Dict[str, Any], Dict[str, str]]:
-        logger.info(f"Generating multiple profiles: {name} (Override: {override})")
+        logger.info("Generating multiple profiles: %s (Override: %s)", name, override)
 
-        all_proxies = []
         subscription_info = {}
 
-        # Load each profile and aggregate proxies
-        for profile_name in name:
-            try:
-                profile = profile_repo.load_profile(profile_name)
-                proxies = profile.get("proxies", [])
-                if proxies:
-                    all_proxies.extend(proxies)
-                    
-                    # Extract subscription info from proxy names
-                    # This works because fetch_and_update_profile now injects this info into a dummy proxy
-                    for proxy in proxies:
-                        self._extract_subscription_info(proxy.get("name", ""), subscription_info)
-
-            except FileNotFoundError:
-                msg = f"Profile '{profile_name}' not found, skipping."
-                logger.warning(msg)
-                # We assume the user might want to generate even if one sub is missing, 
-                # but raising 404 is also valid depending on requirement.
-                # raising 404 here to match original logic strictness:
-                raise HTTPException(status_code=404, detail=f"Profile '{profile_name}' not found.")
-            except IOError as e:
-                logger.error(f"Error loading profile '{profile_name}': {e}")
-                raise HTTPException(status_code=500, detail=f"Error loading profile '{profile_name}'")
+        # Load all profiles concurrently in worker threads to keep file IO and parsing off the event loop.
+        # Failures are collected rather than propagated as they happen, so that the reported
+        # error is always the first failing profile in request order.
+        profiles = await asyncio.gather(*(asyncio.to_thread(self._load_profile, n) for n in name),
+                                        return_exceptions=True)
+        for profile in profiles:
+            if isinstance(profile, BaseException):
+                raise profile
+
+        # Aggregate proxies in request order
+        all_proxies = list(chain.from_iterable(profile.get("proxies") or () for profile in profiles))
+
+        extract = self._extract_subscription_info
+        for profile in profiles:
+            # Profiles fetched with a subscription-userinfo header store the parsed values directly
+            stored_info = profile.get("subscription_info")
+            if stored_info:
+                subscription_info.update((k, str(v)) for k, v in stored_info.items())
+            else:
+                # Legacy fallback: extract subscription info from proxy names
+                # This works because fetch_and_update_profile injects this info into a dummy proxy
+                for proxy in profile.get("proxies") or ():
+                    extract(proxy.get("name", ""), subscription_info)
+
+        # Nothing to build a config around; skip the override load and config synthesis
+        if not all_proxies:
+            raise HTTPException(status_code=404, detail="No proxies in selected profiles")
 
         override_data = {}
         if override:
-            override_data = config_repo.load_override_config(override)
+            override_data = await asyncio.to_thread(config_repo.load_override_config, override)
             if not override_data:
-                logger.warning(f"Override file '{override}' provided but content is empty or file missing.")
+                logger.warning("Override file '%s' provided but content is empty or file missing.", override)
 
-        full_config = self.clash_config_service.add_config_to_proxies(all_proxies, override_data)
+        full_config = await self.clash_config_service.add_config_to_proxies(all_proxies, override_data)
                     
         return full_config, subscription_info
 
+    def get_generation_stamp(self, name: List[str]) -> Optional[Tuple[Any, ...]]:
+        """
+        Returns a value that changes whenever any input of generate_multiple_profiles_with_config
+        (the named profiles or any file in the rules directory) changes, or None if a profile is missing.
+        """
+        profile_stamps = tuple(profile_repo.get_stamp(n) for n in name)
+        if None in profile_stamps:
+            return None
+        return profile_stamps, config_repo.get_stamp()
+
+    def check_profile_name(self, name: str) -> None:
+        """
+        Rejects names that would resolve outside the profile directory with a 400
+        """
+        try:
+            profile_repo.validate_name(name)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    def _load_profile(self, profile_name: str) -> Dict[str, Any]:
+        self.check_profile_name(profile_name)
+        try:
+            return profile_repo.load_profile(profile_name)
+        except FileNotFoundError:
+            logger.warning("Profile '%s' not found, skipping.", profile_name)
+            # We assume the user might want to generate even if one sub is missing, 
+            # but raising 404 is also valid depending on requirement.
+            # raising 404 here to match original logic strictness:
+            raise HTTPException(status_code=404, detail=f"Profile '{profile_name}' not found.")
+        except IOError as e:
+            logger.error("Error loading profile '%s': %s", profile_name, e)
+            raise HTTPException(status_code=500, detail=f"Error loading profile '{profile_name}'")
+
     def _extract_subscription_info(self, proxy_name: str, subscription_info: Dict[str, str]) -> None:        
+        # Most names are plain server labels; a substring test is far cheaper
+        # than a regex miss, so only run the regexes when a label is present
+        lowered = proxy_name.lower()
+        has_traffic = "traffic" in lowered or "流量" in lowered
+        has_expire = "expire" in lowered or "到期" in lowered or "过期" in lowered
+        if not (has_traffic or has_expire):
+            return
+
         # Match Traffic info: e.g., "Traffic: 74.95 GB / 200 GB"
         # Optimized regex to catch Chinese "流量" as well
-        traffic_match = re.search(r"(?:Traffic|流量).*?(\d+(?:\.\d+)?)\s*(GB|G|MB|M).*?(\d+(?:\.\d+)?)\s*(GB|G|MB|M)", proxy_name, re.IGNORECASE)
+        traffic_match = _TRAFFIC_RE.search(proxy_name) if has_traffic else None
         
         if traffic_match:
             used_val, used_unit, total_val, total_unit = traffic_match.groups()
-            
-            def to_bytes(val, unit):
-                unit = unit.upper()
-                multiplier = 1024**3 if 'G' in unit else 1024**2
-                return int(float(val) * multiplier)
 
             # Note: Subscription headers usually give total used (up+down). 
             # We assume it's download for simplicity or split it if needed.
-            download = to_bytes(used_val, used_unit)
-            total = to_bytes(total_val, total_unit)
+            download = int(float(used_val) * _UNIT_MULT[used_unit.upper()])
+            total = int(float(total_val) * _UNIT_MULT[total_unit.upper()])
             
             subscription_info["upload"] = "0" 
             subscription_info["download"] = str(download)
             subscription_info["total"] = str(total)
 
         # Match Expire info: e.g., "Expire: 2026-01-04"
-        expire_match = re.search(r"(?:Expire|到期|过期).*?(\d{4}-\d{2}-\d{2})", proxy_name, re.IGNORECASE)
+        expire_match = _EXPIRE_RE.search(proxy_name) if has_expire else None
         if expire_match:
             expire_date_str = expire_match.group(1)
             try:
-                expire_ts = int(datetime.strptime(expire_date_str, "%Y-%m-%d").timestamp())
+                # The regex guarantees YYYY-MM-DD digits; check the range as strptime does (year >= 1)
+                # Midnight local time, same as datetime.strptime(...).timestamp()
+                y, m, d = map(int, expire_date_str.split("-"))
+                if not (y >= 1 and 1 <= m <= 12 and 1 <= d <= calendar.monthrange(y, m)[1]):
+                    raise ValueError(expire_date_str)
+                expire_ts = int(time.mktime((y, m, d, 0, 0, 0, 0, 0, -1)))
                 subscription_info["expire"] = str(expire_ts)
-            except ValueError:
-                logger.warning(f"Invalid expire date format in proxy name: {proxy_name}")
+            except (ValueError, OverflowError):
+                logger.warning("Invalid expire date format in proxy name: %s", proxy_name)
         
     async def fetch_and_update_profile(self, name: str, url: str) -> int:
-        logger.info(f"Fetching profile '{name}' from {url}")
+        logger.info("Fetching profile '%s' from %s", name, url)
+        self.check_profile_name(name)
         
-        # 1. Use a compatible User-Agent to avoid blocks
-        headers = {
-            "User-Agent": "Clash.Meta/1.18.1 Proxygen/0.1.0",
-            "Accept": "application/x-yaml, text/yaml, text/plain",
-        }
-        
-        async with httpx.AsyncClient(verify=False) as client:
-            try:
-                response = await client.get(url, headers=headers, timeout=30.0, follow_redirects=True)
-                response.raise_for_status()
-            except httpx.RequestError as e:
-                logger.error(f"Network error fetching profile from {url}: {e}")
-                raise HTTPException(status_code=502, detail=f"Network error fetching profile: {e}")
-            except httpx.HTTPStatusError as e:
-                logger.error(f"HTTP error fetching profile from {url}: {e}")
-                raise HTTPException(status_code=e.response.status_code, detail=f"Remote server error: {e}")
+        # 1. Fetch through the shared client (compatible User-Agent, 30s timeout, redirects followed)
+        try:
+            response = await open_http_client().get(url)
+            response.raise_for_status()
+        except httpx.RequestError as e:
+            logger.error("Network error fetching profile from %s: %s", url, e)
+            raise HTTPException(status_code=502, detail=f"Network error fetching profile: {e}")
+        except httpx.HTTPStatusError as e:
+            logger.error("HTTP error fetching profile from %s: %s", url, e)
+            raise HTTPException(status_code=e.response.status_code, detail=f"Remote server error: {e}")
 
         # 2. Parse YAML safely
         try:
-            external_config = safe_load(response.text)
+            # Hand libyaml the raw body; it decodes UTF-8/16 itself, skipping a full str copy of the response
+            external_config = yaml.load(response.content, Loader=Loader)
         except Exception as e:
-            logger.warning(f"Failed to parse YAML: {e}")
+            logger.warning("Failed to parse YAML: %s", e)
             external_config = None
 
         # 3. Validation: Check if it's a valid Clash config (dict with 'proxies')
@@ -125,57 +214,73 @@ class ProfileService:
             if isinstance(external_config, str) or external_config is None:
                 detail_msg += " Detected non-YAML content (possibly Base64). Please use a conversion service (Subconverter) to get a '&flag=clash' URL."
             
-            logger.error(f"Profile content invalid for url: {url}")
+            logger.error("Profile content invalid for url: %s", url)
             raise HTTPException(status_code=400, detail=detail_msg)
 
         proxies = external_config.get("proxies", [])
 
         if not proxies:
-            logger.warning(f"No proxies found in remote URL: {url}")
+            logger.warning("No proxies found in remote URL: %s", url)
             raise HTTPException(status_code=404, detail=f"No proxies found in remote URL")
 
         # 4. Handle Subscription-Userinfo Header
-        # Inject a dummy proxy node so that metadata is preserved in the file 
-        # and can be read back by _extract_subscription_info later.
+        # Store the parsed values alongside the proxies so generate_multiple_profiles_with_config
+        # can read them back directly, and inject a dummy proxy node so clients can see them too.
+        subscription_info = None
         user_info_header = response.headers.get("subscription-userinfo")
         if user_info_header:
-            logger.info(f"Found subscription info header: {user_info_header}")
-            dummy_proxy = self._create_traffic_proxy_node(user_info_header)
+            logger.info("Found subscription info header: %s", user_info_header)
+            info = self._parse_subscription_userinfo(user_info_header)
+            dummy_proxy = self._create_traffic_proxy_node(info)
             if dummy_proxy:
-                # Remove any existing dummy traffic nodes to prevent duplicates
-                proxies = [p for p in proxies if not self._is_traffic_node(p)]
-                # Insert at the top
-                proxies.insert(0, dummy_proxy)
+                # Remove existing traffic nodes to prevent duplicates; info nodes sit at the
+                # top of the list, so only the leading run is checked instead of every proxy
+                leading = 0
+                while leading < len(proxies) and self._is_traffic_node(proxies[leading]):
+                    leading += 1
+                # Replace them with our node at the top in a single slice assignment
+                proxies[:leading] = [dummy_proxy]
+
+                subscription_info = {
+                    "upload": info.get('upload', 0),
+                    "download": info.get('download', 0),
+                    "total": info.get('total', 0),
+                }
+                if info.get('expire'):
+                    subscription_info["expire"] = info['expire']
 
         profile_data = {"proxies": proxies}
+        if subscription_info:
+            profile_data["subscription_info"] = subscription_info
 
+        # Dumping a large proxies list can take a while; do it in a worker thread
         try:
-            profile_repo.save_profile(name, profile_data)
+            await asyncio.to_thread(profile_repo.save_profile, name, profile_data)
         except Exception as e:
-            logger.error(f"Error saving profile '{name}': {e}")
+            logger.error("Error saving profile '%s': %s", name, e)
             raise HTTPException(status_code=500, detail=f"Error saving profile: {e}")
 
-        logger.info(f"Profile '{name}' updated with {len(proxies)} proxies")
+        logger.info("Profile '%s' updated with %s proxies", name, len(proxies))
 
         return len(proxies)
 
     def _is_traffic_node(self, proxy: Dict[str, Any]) -> bool:
         name = proxy.get("name", "")
-        return "Traffic" in name or "流量" in name or "Expire" in name or "到期" in name
+        return any(token in name for token in _TRAFFIC_NODE_TOKENS)
 
-    def _create_traffic_proxy_node(self, header_str: str) -> Optional[Dict[str, Any]]:
+    def _parse_subscription_userinfo(self, header_str: str) -> Dict[str, int]:
         """
-        Parses 'upload=123; download=456; total=789; expire=123456' 
-        and creates a dummy SS proxy named 'Traffic: X GB / Y GB | Expire: YYYY-MM-DD'
+        Parses 'upload=123; download=456; total=789; expire=123456' into a dict of ints.
+        Malformed fields (e.g. an empty expire) are ignored.
+        """
+        return {m.group(1): int(m.group(2)) for m in _USERINFO_FIELD_RE.finditer(header_str)}
+
+    def _create_traffic_proxy_node(self, info: Dict[str, int]) -> Optional[Dict[str, Any]]:
+        """
+        Creates a dummy SS proxy named 'Traffic: X GB / Y GB | Expire: YYYY-MM-DD'
+        from parsed subscription-userinfo values
         """
         try:
-            info = {}
-            parts = header_str.split(';')
-            for part in parts:
-                if '=' in part:
-                    k, v = part.strip().split('=', 1)
-                    info[k.strip()] = int(v.strip())
-            
             upload = info.get('upload', 0)
             download = info.get('download', 0)
             total = info.get('total', 0)
@@ -187,7 +292,7 @@ class ProfileService:
             name_parts = [f"Traffic: {used_gb:.2f} GB / {total_gb:.2f} GB"]
             
             if expire:
-                expire_date = datetime.fromtimestamp(expire).strftime("%Y-%m-%d")
+                expire_date = time.strftime("%Y-%m-%d", time.localtime(expire))
                 name_parts.append(f"Expire: {expire_date}")
 
             final_name = " | ".join(name_parts)
@@ -202,5 +307,5 @@ class ProfileService:
                 "password": "dummy"
             }
         except Exception as e:
-            logger.warning(f"Failed to parse subscription header '{header_str}': {e}")
+            logger.warning("Failed to create traffic node from subscription info %s: %s", info, e)
             return None
\ No newline at end of file
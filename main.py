@@ -1,35 +1,55 @@
 import logging
 from fastapi import FastAPI
 from contextlib import asynccontextmanager
-from rich.logging import RichHandler
 
 from app.api.v2.api import router as api_v2_router
 from app.core.config import settings
+from app.services.profile_service import open_http_client, close_http_client
 
 
 def configure_logging():
-    logging.basicConfig(
-        level="INFO",
-        format="[blue]%(name)s[/]  %(message)s", 
-        datefmt="[%X]",
-        handlers=[RichHandler(rich_tracebacks=True, markup=True)],
-        force=True
-    )
+    if settings.DEV_LOGGING:
+        from rich.logging import RichHandler
+
+        logging.basicConfig(
+            level="INFO",
+            format="[blue]%(name)s[/]  %(message)s", 
+            datefmt="[%X]",
+            handlers=[RichHandler(rich_tracebacks=True, markup=True)],
+            force=True
+        )
+    else:
+        logging.basicConfig(
+            level="INFO",
+            format="%(asctime)s %(name)s %(levelname)s %(message)s",
+            handlers=[logging.StreamHandler()],
+            force=True
+        )
 
     for logger_name in ["uvicorn", "uvicorn.error", "uvicorn.access"]:
         logger = logging.getLogger(logger_name)
         logger.handlers = []
         logger.propagate = True
+
+    # One access log line per request is too costly outside development
+    if not settings.DEV_LOGGING:
+        logging.getLogger("uvicorn.access").setLevel(logging.WARNING)
         
     if not settings.USE_API_KEY:
         logging.getLogger(__name__).warning("API Key authentication is DISABLED. Do not use in production environments.")
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    configure_logging()
+    open_http_client()
+    yield
+    await close_http_client()
+
 app = FastAPI(
     title="Proxy Generator",
+    lifespan=lifespan,
     docs_url="/api/v2/docs",
     openapi_url="/api/v2/openapi.json"
 )
 
-app.add_event_handler("startup", configure_logging)
-
 app.include_router(api_v2_router, prefix="/api/v2")
\ No newline at end of file